@@ -2,22 +2,51 @@
 Defects4J extractor package for analyzing Java method changes.
 """
 
+import importlib
+from typing import Any
+
 from .cli import build_arg_parser, main
-from .defects4j import preprocess_project
-from .extractor import run_diff, run_scan
 from .models import BugMetadata, MethodInfo, TriggeringTestInfo
-from .parser import extract_from_file, iter_java_files, load_java_parser
+
+# Exports backed by the Tree-sitter based modules, imported on first access so
+# that importing the package (and the CLI) stays cheap
+_LAZY_EXPORTS = {
+    "enumerate_bugs": ".defects4j",
+    "preprocess_bugs": ".defects4j",
+    "preprocess_project": ".defects4j",
+    "run_diff": ".extractor",
+    "run_scan": ".extractor",
+    "extract_from_file": ".parser",
+    "extract_from_file_pair": ".parser",
+    "get_parser": ".parser",
+    "iter_java_files": ".parser",
+    "load_java_parser": ".parser",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "MethodInfo",
     "TriggeringTestInfo",
     "BugMetadata",
     "load_java_parser",
+    "get_parser",
     "extract_from_file",
+    "extract_from_file_pair",
     "iter_java_files",
     "run_scan",
     "run_diff",
     "preprocess_project",
+    "enumerate_bugs",
+    "preprocess_bugs",
     "build_arg_parser",
     "main",
 ]
@@ -5,19 +5,163 @@ Command-line interface for the Defects4J extractor.
 from __future__ import annotations
 
 import argparse
+import contextlib
+import itertools
 import os
 import sys
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, Callable, ContextManager, Dict, List, Optional, Tuple
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
+from .console import get_console, interactive
 
-from .defects4j import preprocess_project
-from .extractor import run_diff, run_scan
+# The extraction modules (Tree-sitter, orjson, Rich progress) are imported in
+# main() by the subcommand that needs them, so --help and argument errors
+# don't pay for loading them.
 
-console = Console()
+
+def _echo(message: str, style: Optional[str] = None) -> None:
+    """Print a status line to stderr, styled when attached to a terminal."""
+    if interactive():
+        get_console().print(message, style=style, markup=False, highlight=False)
+    else:
+        print(message, file=sys.stderr)
+
+
+def _announce(mode: str, heading: str, fields: Dict[str, object]) -> None:
+    """Show a run summary: a Rich panel on a terminal, plain lines otherwise."""
+    title = f"Defects4J Extractor - {mode} Mode"
+    details = "\n".join(f"{label}: {value}" for label, value in fields.items())
+    if interactive():
+        from rich.panel import Panel
+        from rich.text import Text
+
+        # Assembled from styled parts, so no markup parsing, and paths that
+        # contain "[...]" are shown verbatim
+        body = Text.assemble((heading, "cyan"), "\n", details)
+        get_console().print(Panel(body, title=Text(title, style="bold blue")))
+    else:
+        print(f"{title}\n{heading}\n{details}", file=sys.stderr)
+
+
+def _report_project_counts(projects: Tuple[str, ...], counts: Dict[str, int]) -> None:
+    """Summarize bugs preprocessed per project: a table or plain stderr lines."""
+    if not interactive():
+        for project in projects:
+            count = counts.get(project, 0)
+            print(f"{project}: {count} bug(s) preprocessed", file=sys.stderr)
+        return
+
+    from rich.table import Table
+
+    table = Table(title="Preprocessed projects")
+    table.add_column("Project", style="cyan")
+    table.add_column("Bugs", justify="right")
+    for project in projects:
+        table.add_row(project, str(counts.get(project, 0)))
+    get_console().print(table)
+
+
+def _report_errors(errors: List[Tuple[str, int, str]]) -> None:
+    """List failed bugs: a Rich table on a terminal, plain lines otherwise."""
+    if not interactive():
+        for project, bug_id, message in errors:
+            print(f"Failed {project}-{bug_id}: {message}", file=sys.stderr)
+        return
+
+    from rich.table import Table
+
+    table = Table(title=f"{len(errors)} failed bug(s)", title_style="red")
+    table.add_column("Bug", style="cyan", no_wrap=True)
+    table.add_column("Error")
+    for project, bug_id, message in errors:
+        table.add_row(f"{project}-{bug_id}", message)
+    get_console().print(table)
+
+
+def _open_output(out_path: Optional[Path]) -> ContextManager[Optional[BinaryIO]]:
+    """Open the record output once with a large buffer; None stands for stdout."""
+    if out_path is None:
+        return contextlib.nullcontext()
+    from .extractor import OUTPUT_BUFFER_SIZE
+
+    return open(out_path, "wb", buffering=OUTPUT_BUFFER_SIZE)
+
+
+def _run_to_output(
+    out_path: Optional[Path], run: Callable[[Optional[BinaryIO]], int]
+) -> int:
+    """Run an extraction into the opened output.
+
+    No spinner is shown: the extraction has its own progress bar, and its
+    worker processes must be forked before any display thread starts.
+    """
+    with _open_output(out_path) as out:
+        return run(out)
+
+
+# CPUs this process may actually run on; os.cpu_count() reports every host CPU
+# even when the affinity mask (e.g. in a container) is narrower
+_DEFAULT_JOBS = (
+    len(os.sched_getaffinity(0))
+    if hasattr(os, "sched_getaffinity")
+    else (os.cpu_count() or 4)
+)
+
+# Default includes all 17 Defects4J projects as of v3.0.1:
+# Chart(26), Cli(39), Closure(174), Codec(18), Collections(28), Compress(47),
+# Csv(16), Gson(18), JacksonCore(26), JacksonDatabind(110), JacksonXml(6),
+# Jsoup(93), JxPath(22), Lang(61), Math(106), Mockito(38), Time(26)
+# Total: 854 active bugs across all projects
+_DEFAULT_PROJECTS = (
+    "Chart",
+    "Cli",
+    "Closure",
+    "Codec",
+    "Collections",
+    "Compress",
+    "Csv",
+    "Gson",
+    "JacksonCore",
+    "JacksonDatabind",
+    "JacksonXml",
+    "Jsoup",
+    "JxPath",
+    "Lang",
+    "Math",
+    "Mockito",
+    "Time",
+)
+# The --projects default; main() recognizes it by identity and skips parsing
+_DEFAULT_PROJECTS_STR = ",".join(_DEFAULT_PROJECTS)
+
+
+def _positive_int(value: str) -> int:
+    """argparse type for options that only make sense as 1 or more."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def _add_cache_arguments(p: argparse.ArgumentParser) -> None:
+    """Add the extraction cache options shared by all subcommands."""
+    p.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help=(
+            "Cache per-file extraction results here, keyed by file content hash "
+            "(default: ~/.cache/defects4j-extractor)"
+        ),
+    )
+    p.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither read nor write the extraction cache",
+    )
 
 
 def build_arg_parser() -> argparse.ArgumentParser:
@@ -37,6 +181,18 @@ def build_arg_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Emit JSON lines instead of a single JSON array",
     )
+    p_scan.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Indent JSON array output (ignored with --jsonl)",
+    )
+    p_scan.add_argument(
+        "--jobs",
+        type=int,
+        default=_DEFAULT_JOBS,
+        help="Number of parallel workers for parsing files (1 disables parallelism)",
+    )
+    _add_cache_arguments(p_scan)
 
     p_diff = sub.add_parser(
         "diff", help="Compare buggy and fixed trees and extract relevant methods"
@@ -51,19 +207,26 @@ def build_arg_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Emit JSON lines instead of a single JSON array",
     )
+    p_diff.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Indent JSON array output (ignored with --jsonl)",
+    )
+    p_diff.add_argument(
+        "--jobs",
+        type=int,
+        default=_DEFAULT_JOBS,
+        help="Number of parallel workers for parsing files (1 disables parallelism)",
+    )
+    _add_cache_arguments(p_diff)
 
     p_pre = sub.add_parser(
         "preprocess", help="Process Defects4J bugs and build method-level diff data"
     )
-    # Default includes all 17 Defects4J projects as of v3.0.1:
-    # Chart(26), Cli(39), Closure(174), Codec(18), Collections(28), Compress(47),
-    # Csv(16), Gson(18), JacksonCore(26), JacksonDatabind(110), JacksonXml(6),
-    # Jsoup(93), JxPath(22), Lang(61), Math(106), Mockito(38), Time(26)
-    # Total: 854 active bugs across all projects
     p_pre.add_argument(
         "--projects",
         type=str,
-        default="Chart,Cli,Closure,Codec,Collections,Compress,Csv,Gson,JacksonCore,JacksonDatabind,JacksonXml,Jsoup,JxPath,Lang,Math,Mockito,Time",
+        default=_DEFAULT_PROJECTS_STR,
         help="Comma-separated list of D4J projects (default: all 17 available projects)",
     )
     p_pre.add_argument(
@@ -103,102 +266,208 @@ def build_arg_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Stop on first checkout/diff error instead of skipping",
     )
+    p_pre.add_argument(
+        "--max-errors",
+        type=_positive_int,
+        default=None,
+        help="Start no further bugs once this many have failed (default: never)",
+    )
     p_pre.add_argument(
         "--jobs",
         type=int,
-        default=(os.cpu_count() or 4),
+        default=_DEFAULT_JOBS,
         help="Number of parallel workers for preprocessing (1 disables parallelism)",
     )
+    _add_cache_arguments(p_pre)
 
     return p
 
 
+# Built on the first main() call and reused by later in-process calls; parse_args
+# keeps no per-call state on the parser itself
+_PARSER: Optional[argparse.ArgumentParser] = None
+# Top-level --help output, formatted once
+_HELP_TEXT: Optional[str] = None
+
+
 def main(argv: Optional[List[str]] = None) -> int:
     """Main entry point for the CLI."""
-    ap = build_arg_parser()
-    args = ap.parse_args(argv)
+    global _PARSER, _HELP_TEXT
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv == ["--help"] or argv == ["-h"]:
+        if _HELP_TEXT is None:
+            if _PARSER is None:
+                _PARSER = build_arg_parser()
+            _HELP_TEXT = _PARSER.format_help()
+        sys.stdout.write(_HELP_TEXT)
+        return 0
+    if len(argv) == 2 and argv[0] == "scan" and not argv[1].startswith("-"):
+        # Plain `scan <source>` with every option at its default (keep in sync
+        # with build_arg_parser): no need to build or run the parser
+        args = argparse.Namespace(
+            cmd="scan",
+            source=argv[1],
+            out=None,
+            jsonl=False,
+            pretty=False,
+            jobs=_DEFAULT_JOBS,
+            cache_dir=None,
+            no_cache=False,
+        )
+    else:
+        if _PARSER is None:
+            _PARSER = build_arg_parser()
+        args = _PARSER.parse_args(argv)
+
+    out_path = Path(args.out) if args.out else None
+    if args.no_cache:
+        cache_dir = None
+    elif args.cache_dir:
+        cache_dir = Path(args.cache_dir)
+    else:
+        from .parser import default_cache_dir
 
-    out_path = Path(args.out) if getattr(args, "out", None) else None
+        cache_dir = default_cache_dir()
 
     if args.cmd == "scan":
-        source_root = Path(args.source).resolve()
-        if not source_root.exists():
-            console.print(f"[red]Error:[/red] Source root not found: {source_root}")
+        from .extractor import run_scan
+
+        source_root = os.path.abspath(args.source)
+        if not os.path.isdir(source_root):
+            _echo(f"Error: Source root not found: {source_root}", style="red")
             return 2
-        
-        console.print(Panel(
-            f"[cyan]Scanning Java source tree[/cyan]\n"
-            f"Source: {source_root}\n"
-            f"Output: {out_path or 'stdout'}\n"
-            f"Format: {'JSONL' if args.jsonl else 'JSON'}",
-            title="[bold blue]Defects4J Extractor - Scan Mode[/bold blue]"
-        ))
-        
-        with console.status("[bold green]Extracting methods..."):
-            count = run_scan(source_root, out_path, args.jsonl)
-        
-        console.print(f"[green]✓[/green] Extracted {count} methods from {source_root}")
+
+        _announce(
+            "Scan",
+            "Scanning Java source tree",
+            {
+                "Source": source_root,
+                "Output": out_path or "stdout",
+                "Format": "JSONL" if args.jsonl else "JSON",
+                "Parallel jobs": args.jobs,
+            },
+        )
+        count = _run_to_output(
+            out_path,
+            lambda out: run_scan(
+                source_root,
+                out,
+                args.jsonl,
+                jobs=args.jobs,
+                cache_dir=cache_dir,
+                pretty=args.pretty,
+            ),
+        )
+        _echo(f"✓ Extracted {count} methods from {source_root}", style="green")
         return 0
-        
+
     if args.cmd == "diff":
-        buggy_root = Path(args.buggy).resolve()
-        fixed_root = Path(args.fixed).resolve()
+        from .extractor import run_diff
+
+        buggy_root = os.path.abspath(args.buggy)
+        fixed_root = os.path.abspath(args.fixed)
         for p in (buggy_root, fixed_root):
-            if not p.exists():
-                console.print(f"[red]Error:[/red] Path not found: {p}")
+            if not os.path.isdir(p):
+                _echo(f"Error: Path not found: {p}", style="red")
                 return 2
-        
-        console.print(Panel(
-            f"[cyan]Comparing buggy and fixed source trees[/cyan]\n"
-            f"Buggy: {buggy_root}\n"
-            f"Fixed: {fixed_root}\n"
-            f"Output: {out_path or 'stdout'}\n"
-            f"Format: {'JSONL' if args.jsonl else 'JSON'}",
-            title="[bold blue]Defects4J Extractor - Diff Mode[/bold blue]"
-        ))
-        
-        with console.status("[bold green]Computing method differences..."):
-            count = run_diff(buggy_root, fixed_root, out_path, args.jsonl)
-        
-        console.print(f"[green]✓[/green] Extracted {count} changed methods")
+
+        _announce(
+            "Diff",
+            "Comparing buggy and fixed source trees",
+            {
+                "Buggy": buggy_root,
+                "Fixed": fixed_root,
+                "Output": out_path or "stdout",
+                "Format": "JSONL" if args.jsonl else "JSON",
+                "Parallel jobs": args.jobs,
+            },
+        )
+        count = _run_to_output(
+            out_path,
+            lambda out: run_diff(
+                buggy_root,
+                fixed_root,
+                out,
+                args.jsonl,
+                cache_dir=cache_dir,
+                pretty=args.pretty,
+                jobs=args.jobs,
+            ),
+        )
+        _echo(f"✓ Extracted {count} changed methods", style="green")
         return 0
-        
+
     if args.cmd == "preprocess":
-        projects = [
-            x.strip()
-            for x in (args.project_only or args.projects).split(",")
-            if x.strip()
-        ]
-        out_dir = Path(args.out).resolve()
+        from .defects4j import enumerate_bugs, load_done_manifest, preprocess_bugs
+
+        raw_projects = args.project_only or args.projects
+        if raw_projects is _DEFAULT_PROJECTS_STR:
+            projects = _DEFAULT_PROJECTS
+        else:
+            projects = tuple(
+                x.strip() for x in raw_projects.split(",") if x.strip()
+            )
+        out_dir = Path(os.path.abspath(args.out))
         out_dir.mkdir(parents=True, exist_ok=True)
-        
-        console.print(Panel(
-            f"[cyan]Preprocessing Defects4J projects[/cyan]\n"
-            f"Projects: {', '.join(projects)}\n"
-            f"Output directory: {out_dir}\n"
-            f"ID range: {args.start_id or 'auto'} to {args.end_id or 'auto'}\n"
-            f"Main source only: {args.main_only}\n"
-            f"Force overwrite: {args.force}\n"
-            f"Parallel jobs: {getattr(args, 'jobs', 1)}",
-            title="[bold blue]Defects4J Extractor - Preprocess Mode[/bold blue]"
-        ))
-        
-        total = 0
-        for proj in projects:
-            console.print(f"\n[bold cyan]Processing project: {proj}[/bold cyan]")
-            total += preprocess_project(
-                proj,
-                out_dir,
-                start_id=args.start_id,
-                end_id=args.end_id,
-                main_only=args.main_only,
-                force=args.force,
-                stop_on_error=getattr(args, "stop_on_error", False),
-                jobs=getattr(args, "jobs", 1),
+
+        _announce(
+            "Preprocess",
+            "Preprocessing Defects4J projects",
+            {
+                "Projects": ", ".join(projects),
+                "Output directory": out_dir,
+                "ID range": f"{args.start_id or 'auto'} to {args.end_id or 'auto'}",
+                "Main source only": args.main_only,
+                "Force overwrite": args.force,
+                "Parallel jobs": args.jobs,
+            },
+        )
+
+        jobs = args.jobs
+        # Read once here rather than per project; --force redoes everything
+        done = None if args.force else load_done_manifest(out_dir)
+        per_project = [
+            enumerate_bugs(
+                proj, out_dir, args.start_id, args.end_id, args.force, done
+            )
+            for proj in projects
+        ]
+        # Interleave projects round-robin in one flat queue, so a project with
+        # a long tail of bugs never leaves the other workers idle
+        tasks = [
+            task
+            for group in itertools.zip_longest(*per_project)
+            for task in group
+            if task is not None
+        ]
+
+        max_errors = args.max_errors
+        errors: List[Tuple[str, int, str]] = []
+        counts = preprocess_bugs(
+            tasks,
+            out_dir,
+            args.main_only,
+            args.force,
+            stop_on_error=args.stop_on_error,
+            jobs=jobs,
+            cache_dir=cache_dir,
+            errors=errors,
+            max_errors=max_errors,
+        )
+        total = sum(counts.values())
+        _report_project_counts(projects, counts)
+
+        if errors:
+            _report_errors(errors)
+        _echo(f"\n✓ Preprocessed {total} bug(s) into {out_dir}", style="green")
+        if max_errors is not None and len(errors) >= max_errors:
+            _echo(
+                f"Stopped after {len(errors)} error(s) (--max-errors {max_errors})",
+                style="red",
             )
-        
-        console.print(f"\n[green]✓[/green] Preprocessed {total} bug(s) into {out_dir}")
+            return 1
         return 0
-        
-    ap.print_help()
+
+    (_PARSER or build_arg_parser()).print_help()
     return 2
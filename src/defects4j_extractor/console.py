@@ -0,0 +1,94 @@
+"""
+Status output on stderr, shared by the CLI and the extraction modules.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from typing import TYPE_CHECKING, Any, List, Optional, Union, cast
+
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.progress import Progress, TaskID
+
+# Rich is imported on first use and only when stderr is a terminal, so
+# redirected runs never pay for loading it
+_console: Optional[Console] = None
+
+# The style tags used in status messages, dropped when printing plain text
+_MARKUP_RE = re.compile(r"\[/?(?:bold|dim|green|red|yellow)\]")
+
+
+def get_console() -> Console:
+    """Return the shared stderr Rich console, importing Rich on first use."""
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console(stderr=True)
+    return _console
+
+
+def interactive() -> bool:
+    """Whether status output goes to a terminal and should use the Rich UI."""
+    return sys.stderr.isatty()
+
+
+def print_status(message: str = "") -> None:
+    """Print a status line with Rich markup; plain text when not on a terminal."""
+    if interactive():
+        get_console().print(message)
+    else:
+        print(_MARKUP_RE.sub("", message), file=sys.stderr)
+
+
+class _NullProgress:
+    """Stand-in for a Rich Progress that shows nothing."""
+
+    _TASK = cast("TaskID", 0)
+
+    def __enter__(self) -> _NullProgress:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+    def add_task(
+        self, description: str, total: Optional[float] = None, **fields: Any
+    ) -> TaskID:
+        return self._TASK
+
+    def update(self, task_id: TaskID, **fields: Any) -> None:
+        return None
+
+    def advance(self, task_id: TaskID, advance: float = 1) -> None:
+        return None
+
+
+def progress_bar(time_remaining: bool = False) -> Union[Progress, _NullProgress]:
+    """Progress bar on the status console; a no-op when not on a terminal."""
+    if not interactive():
+        return _NullProgress()
+
+    from rich.progress import (
+        BarColumn,
+        Progress,
+        ProgressColumn,
+        SpinnerColumn,
+        TaskProgressColumn,
+        TextColumn,
+        TimeElapsedColumn,
+        TimeRemainingColumn,
+    )
+
+    columns: List[ProgressColumn] = [
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        TimeElapsedColumn(),
+    ]
+    if time_remaining:
+        columns.append(TimeRemainingColumn())
+    return Progress(*columns, console=get_console())
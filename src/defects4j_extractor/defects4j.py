@@ -4,40 +4,37 @@ Defects4J integration functionality for bug preprocessing and metadata extractio
 
 from __future__ import annotations
 
-import dataclasses
+import contextlib
+import csv
 import functools
+import io
 import os
 import re
 import subprocess
 import sys
 import tempfile
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 import orjson
-from rich.console import Console
-from rich.progress import (
-    Progress,
-    SpinnerColumn,
-    TextColumn,
-    BarColumn,
-    TaskProgressColumn,
-    TimeElapsedColumn,
-    TimeRemainingColumn,
-)
 
-from .models import BugMetadata, MethodInfo, TriggeringTestInfo, StackTraceElement
+from .console import print_status, progress_bar
+from .extractor import _extract_pair_worker, diff_file_methods
+from .models import BugMetadata, TriggeringTestInfo, StackTraceElement
 from .parser import (
-    extract_from_file,
     find_package_name,
+    get_parser,
+    iter_java_file_pairs,
     iter_java_files,
-    load_java_parser,
-    read_text_bytes,
+    method_class_qualifiers,
+    process_pool_context,
+    read_bytes,
     walk_methods,
 )
 
-console = Console()
+# Used with .match(), which anchors at the start; nothing after the id is needed
+_BUG_ID_LINE_RE = re.compile(r"(\d+)\b")
 
 
 def _run_cmd(cmd: List[str], cwd: Optional[Path] = None) -> Tuple[int, str, str]:
@@ -55,7 +52,7 @@ def _run_cmd(cmd: List[str], cwd: Optional[Path] = None) -> Tuple[int, str, str]
 
 def _defects4j_bug_ids(project: str) -> List[int]:
     """Query available active bug ids via defects4j info -p <proj>."""
-    console.print(f"[dim]Querying active bug IDs for project {project}...[/dim]")
+    print_status(f"[dim]Querying active bug IDs for project {project}...[/dim]")
     code, out, err = _run_cmd(["defects4j", "info", "-p", project])
     if code != 0:
         raise RuntimeError(f"defects4j info failed for {project}: {err}")
@@ -67,10 +64,10 @@ def _defects4j_bug_ids(project: str) -> List[int]:
         # Skip deprecated entries if marked in info output
         if "deprecated" in line.lower():
             continue
-        m = re.match(r"^(\d+)\b.*", line)
+        m = _BUG_ID_LINE_RE.match(line)
         if m:
             ids.append(int(m.group(1)))
-    console.print(f"[dim]Found {len(ids)} active bug IDs for project {project}[/dim]")
+    print_status(f"[dim]Found {len(ids)} active bug IDs for project {project}[/dim]")
     return sorted(set(ids))
 
 
@@ -102,48 +99,49 @@ def _is_active_bug(project: str, bug_id: int, active_bugs: Optional[Set[int]] =
     return bug_id in active_bugs
 
 
-def _query_bug_metadata(project: str, bug_id: int) -> BugMetadata:
-    """Use defects4j query to get detailed bug information."""
-    console.print(f"[dim]Querying metadata for {project}-{bug_id}...[/dim]")
-    cmd = [
-        "defects4j",
-        "query",
-        "-p",
-        project,
-        "-q",
-        "bug.id,revision.id.buggy,revision.id.fixed,classes.modified,tests.trigger,tests.trigger.cause,tests.relevant",
-    ]
-    code, out, err = _run_cmd(cmd)
+_METADATA_FIELDS = (
+    "bug.id,revision.id.buggy,revision.id.fixed,classes.modified,"
+    "tests.trigger,tests.trigger.cause,tests.relevant"
+)
+
+
+def _query_metadata_rows(project: str) -> Dict[int, List[str]]:
+    """Query metadata columns for every active bug of a project in one call."""
+    # defects4j query always reports the whole project, so one invocation
+    # serves all bugs instead of re-running it per bug
+    code, out, err = _run_cmd(
+        ["defects4j", "query", "-p", project, "-q", _METADATA_FIELDS]
+    )
     if code != 0:
-        raise RuntimeError(f"defects4j query failed for {project}-{bug_id}: {err}")
+        raise RuntimeError(f"defects4j query failed for {project}: {err}")
 
-    # Parse the CSV-like output - defects4j query returns CSV format without headers
-    lines = out.strip().split("\n")
-    if not lines:
-        raise RuntimeError(f"No query output for {project}-{bug_id}")
+    # Output is CSV without headers; fields may be quoted and contain commas
+    rows: Dict[int, List[str]] = {}
+    for values in csv.reader(io.StringIO(out)):
+        if not values:
+            continue
+        try:
+            rows[int(values[0].strip())] = values
+        except ValueError:
+            continue
+    return rows
 
-    # Find the data line for our bug
-    data_line = None
-    for line in lines:
-        if line.strip().startswith(str(bug_id) + ","):
-            data_line = line.strip()
-            break
 
-    if not data_line:
-        raise RuntimeError(f"Bug {bug_id} not found in query results for {project}")
+def _query_bug_metadata(
+    project: str, bug_id: int, values: Optional[List[str]] = None
+) -> BugMetadata:
+    """Use defects4j query to get detailed bug information.
 
-    # Parse the CSV line - we know the column order from our query
-    # Columns: bug.id,revision.id.buggy,revision.id.fixed,classes.modified,tests.trigger,tests.trigger.cause,tests.relevant
-    try:
-        # Handle CSV parsing for lines with potential quoted fields containing commas
-        import csv
-        import io
-        reader = csv.reader(io.StringIO(data_line))
-        values = next(reader)
-    except:
-        # Fallback to simple split if CSV parsing fails
-        values = data_line.split(",")
+    ``values`` is the bug's row from ``_query_metadata_rows``; when omitted the
+    project is queried here.
+    """
+    if values is None:
+        print_status(f"[dim]Querying metadata for {project}-{bug_id}...[/dim]")
+        values = _query_metadata_rows(project).get(bug_id)
+        if values is None:
+            raise RuntimeError(f"Bug {bug_id} not found in query results for {project}")
 
+    # Columns: bug.id,revision.id.buggy,revision.id.fixed,classes.modified,tests.trigger,tests.trigger.cause,tests.relevant
     if len(values) < 7:
         raise RuntimeError(f"Unexpected query output format for {project}-{bug_id}: expected 7 columns, got {len(values)}")
 
@@ -299,7 +297,7 @@ def _parse_stack_trace(raw_trace: str) -> List[StackTraceElement]:
 
 def _run_failing_test(project: str, bug_id: int, test_class: str, test_method: str, checkout_dir: Path) -> Tuple[Optional[str], Optional[str]]:
     """Run a specific failing test and capture its output including stack traces."""
-    console.print(f"[dim]Running failing test {test_class}::{test_method} for {project}-{bug_id}...[/dim]")
+    print_status(f"[dim]Running failing test {test_class}::{test_method} for {project}-{bug_id}...[/dim]")
     
     # Use defects4j test command to run specific test
     cmd = [
@@ -338,7 +336,7 @@ def _run_failing_test(project: str, bug_id: int, test_class: str, test_method: s
         return exception_output, raw_stack_trace
         
     except Exception as e:
-        console.print(f"[red]Error running test {test_class}::{test_method}: {e}[/red]")
+        print_status(f"[red]Error running test {test_class}::{test_method}: {e}[/red]")
         return None, None
 
 
@@ -347,7 +345,7 @@ def _enhance_triggering_tests_with_stack_traces(project: str, bug_id: int, trigg
     if not triggering_tests:
         return
         
-    console.print(f"[dim]Collecting stack traces for {len(triggering_tests)} triggering tests...[/dim]")
+    print_status(f"[dim]Collecting stack traces for {len(triggering_tests)} triggering tests...[/dim]")
     
     for test_info in triggering_tests:
         if not test_info.test_class or not test_info.test_method:
@@ -376,7 +374,7 @@ def _checkout_bug(project: str, bug_id: int, dest: Path, fixed: bool) -> None:
     """Checkout a specific bug version using defects4j."""
     version = f"{bug_id}{'f' if fixed else 'b'}"
     version_type = "fixed" if fixed else "buggy"
-    console.print(f"[dim]Checking out {version_type} version of {project}-{bug_id}...[/dim]")
+    print_status(f"[dim]Checking out {version_type} version of {project}-{bug_id}...[/dim]")
     code, out, err = _run_cmd(
         ["defects4j", "checkout", "-p", project, "-v", version, "-w", str(dest)]
     )
@@ -411,7 +409,7 @@ def _extract_test_method_code(
     parser, test_root: Path, triggering_tests: List[TriggeringTestInfo]
 ) -> None:
     """Extract source code for triggering test methods."""
-    console.print(f"[dim]Extracting test method code for {len(triggering_tests)} triggering tests...[/dim]")
+    print_status(f"[dim]Extracting test method code for {len(triggering_tests)} triggering tests...[/dim]")
     # Build a map from test class name to potential file paths
     class_to_files: Dict[str, List[Path]] = {}
 
@@ -424,18 +422,15 @@ def _extract_test_method_code(
 
         # Also try to extract from package structure
         try:
-            text_str, data = read_text_bytes(java_file)
+            data = read_bytes(java_file)
             tree = parser.parse(data)
-            root = tree.root_node
-            package_name = find_package_name(root, data)
 
-            # Find class declarations
-            for method_info in walk_methods(
-                root, data, text_str, package_name, str(java_file)
-            ):
-                if method_info.class_qualifier:
+            # Find class declarations; only their names are needed here, so
+            # method bodies are not decoded
+            for class_qualifier in method_class_qualifiers(tree.root_node, data):
+                if class_qualifier:
                     # Use the full class qualifier as a potential match
-                    class_key = method_info.class_qualifier.split("$")[
+                    class_key = class_qualifier.split("$")[
                         0
                     ]  # Handle inner classes
                     if not class_to_files.get(class_key):
@@ -469,13 +464,13 @@ def _extract_test_method_code(
         # Search for the test method in potential files
         for java_file in potential_files:
             try:
-                text_str, data = read_text_bytes(java_file)
+                data = read_bytes(java_file)
                 tree = parser.parse(data)
                 root = tree.root_node
                 package_name = find_package_name(root, data)
 
                 for method_info in walk_methods(
-                    root, data, text_str, package_name, str(java_file)
+                    root, data, package_name, str(java_file), params_needed=False
                 ):
                     if method_info.method_name == test_info.test_method:
                         # Check if this is likely the right class
@@ -499,17 +494,70 @@ def _extract_test_method_code(
                 continue
 
 
-def preprocess_project(
+# Written into the output directory; one JSON object per successfully
+# processed bug, so reruns can skip finished bugs without touching their outputs
+DONE_MANIFEST_NAME = ".done.jsonl"
+
+
+def load_done_manifest(out_dir: Path) -> Set[Tuple[str, int]]:
+    """Read the (project, bug_id) pairs recorded as done in ``out_dir``."""
+    done: Set[Tuple[str, int]] = set()
+    try:
+        data = (out_dir / DONE_MANIFEST_NAME).read_bytes()
+    except OSError:
+        return done
+    for line in data.splitlines():
+        try:
+            entry = orjson.loads(line)
+            done.add((entry["project"], int(entry["bug_id"])))
+        except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+            # A torn last line from an interrupted run; the bug is redone
+            continue
+    return done
+
+
+@contextlib.contextmanager
+def _open_done_manifest(out_dir: Path) -> Iterator[Callable[[str, int], None]]:
+    """Yield a function that appends one finished bug to the manifest."""
+    # One O_APPEND write per bug keeps lines whole when several project
+    # workers share the file, and nothing is lost if the run is killed
+    fd = os.open(
+        str(out_dir / DONE_MANIFEST_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+    )
+
+    def mark_done(project: str, bug_id: int) -> None:
+        os.write(
+            fd,
+            orjson.dumps(
+                {"project": project, "bug_id": bug_id},
+                option=orjson.OPT_APPEND_NEWLINE,
+            ),
+        )
+
+    try:
+        yield mark_done
+    finally:
+        os.close(fd)
+
+
+# One unit of preprocessing work: (project, bug_id, metadata row or None)
+BugTask = Tuple[str, int, Optional[List[str]]]
+
+
+def enumerate_bugs(
     project: str,
     out_dir: Path,
     start_id: Optional[int],
     end_id: Optional[int],
-    main_only: bool,
     force: bool,
-    stop_on_error: bool = False,
-    jobs: int = 1,
-) -> int:
-    """Process Defects4J bugs and build method-level diff data."""
+    done: Optional[Set[Tuple[str, int]]] = None,
+) -> List[BugTask]:
+    """List the active bugs of a project that still need processing.
+
+    Deprecated bugs and bugs outside [start_id, end_id] are dropped, and unless
+    ``force`` is set so are bugs listed in ``done`` or with an existing output.
+    Each task carries the bug's metadata row when the project query succeeded.
+    """
     ids = _defects4j_bug_ids(project)
     if not ids:
         # Fallback to provided range or a sane default; deprecated bugs will be skipped during checkout
@@ -524,28 +572,78 @@ def preprocess_project(
         hi = end_id if end_id is not None else max(ids) if ids else lo
         ids = [i for i in ids if lo <= i <= hi]
 
-    console.print(f"[bold]Processing {len(ids)} bugs for project {project}[/bold]")
-    console.print(f"Bug IDs: {ids[:10]}{'...' if len(ids) > 10 else ''}")
-    console.print(f"Parallel jobs: {jobs}, Force overwrite: {force}")
-    console.print()
+    print_status(f"[bold]Processing {len(ids)} bugs for project {project}[/bold]")
+    print_status(f"Bug IDs: {ids[:10]}{'...' if len(ids) > 10 else ''}")
+    print_status()
 
-    # Get active bugs list once to avoid repeated queries
-    console.print(f"[dim]Getting active bugs list for {project}...[/dim]")
-    active_bugs = _get_active_bug_ids(project)
-    console.print(f"[dim]Found {len(active_bugs)} active bugs total[/dim]")
+    # Query metadata for all active bugs once; the rows double as the active
+    # bug list and spare each worker its own full-project query
+    print_status(f"[dim]Getting active bugs and metadata for {project}...[/dim]")
+    metadata_rows: Optional[Dict[int, List[str]]]
+    try:
+        metadata_rows = _query_metadata_rows(project)
+        active_bugs = set(metadata_rows)
+    except RuntimeError as ex:
+        print_status(f"[yellow]⚠[/yellow] {ex}")
+        metadata_rows = None
+        active_bugs = _get_active_bug_ids(project)
+    print_status(f"[dim]Found {len(active_bugs)} active bugs total[/dim]")
     
     # Filter to only active bugs
     active_ids = [bug_id for bug_id in ids if bug_id in active_bugs]
     skipped_count = len(ids) - len(active_ids)
     if skipped_count > 0:
-        console.print(f"[dim]Silently skipping {skipped_count} deprecated bug(s)[/dim]")
+        print_status(f"[dim]Silently skipping {skipped_count} deprecated bug(s)[/dim]")
     
     # Update ids to only process active bugs
     ids = active_ids
     
     if not ids:
-        console.print(f"[yellow]⚠[/yellow] No active bugs to process for {project}")
-        return 0
+        print_status(f"[yellow]⚠[/yellow] No active bugs to process for {project}")
+        return []
+
+    # Drop bugs with existing outputs before any checkout or worker is started
+    if not force:
+        done = done or set()
+        pending_ids = [
+            bug_id
+            for bug_id in ids
+            if (project, bug_id) not in done
+            and not _bug_output_path(out_dir, project, bug_id).exists()
+        ]
+        if len(pending_ids) < len(ids):
+            print_status(
+                f"[dim]Skipping {len(ids) - len(pending_ids)} bug(s) with existing output[/dim]"
+            )
+        ids = pending_ids
+    return [
+        (project, bug_id, metadata_rows.get(bug_id) if metadata_rows else None)
+        for bug_id in ids
+    ]
+
+
+def preprocess_bugs(
+    tasks: List[BugTask],
+    out_dir: Path,
+    main_only: bool,
+    force: bool,
+    stop_on_error: bool = False,
+    jobs: int = 1,
+    cache_dir: Optional[Path] = None,
+    errors: Optional[List[Tuple[str, int, str]]] = None,
+    max_errors: Optional[int] = None,
+) -> Dict[str, int]:
+    """Process bug tasks, possibly from several projects, in one worker pool.
+
+    Returns the number of bugs processed per project. Failed bugs are appended
+    to ``errors`` as (project, bug_id, message) when a list is given; once
+    ``max_errors`` bugs have failed no further bugs are started. Every bug
+    processed successfully is appended to the output manifest.
+    """
+    processed: Dict[str, int] = dict.fromkeys((task[0] for task in tasks), 0)
+    if not tasks:
+        return processed
+    failed = errors if errors is not None else []
 
     # Normalize jobs
     jobs = int(jobs) if isinstance(jobs, int) else 1
@@ -555,73 +653,153 @@ def preprocess_project(
     # Create a partial function for parallel processing that binds the parameters
     process_func = functools.partial(
         _process_one_bug_impl,
-        project=project,
         out_dir=out_dir,
         main_only=main_only,
         force=force,
         stop_on_error=stop_on_error,
+        cache_dir=cache_dir,
     )
 
+    def limit_reached() -> bool:
+        return max_errors is not None and len(failed) >= max_errors
+
     # Fallback to sequential if requested to stop on first error or single worker
-    if stop_on_error or jobs == 1:
-        processed = 0
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            TaskProgressColumn(),
-            TimeElapsedColumn(),
-            TimeRemainingColumn(),
-            console=console,
-        ) as progress:
-            task = progress.add_task(f"Processing {project} bugs", total=len(ids))
-            for bug_id in ids:
-                progress.update(task, description=f"Processing {project}-{bug_id}")
-                processed += process_func(bug_id)
-                progress.advance(task)
-        return processed
+    sequential = stop_on_error or jobs == 1
+    if not sequential:
+        print_status(f"[bold]Starting parallel processing with {jobs} workers...[/bold]")
+    with contextlib.ExitStack() as stack:
+        mark_done = stack.enter_context(_open_done_manifest(out_dir))
+        futures: Dict[Future, Tuple[str, int]] = {}
+        if not sequential:
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=jobs, mp_context=process_pool_context())
+            )
+            # Submitting forks every worker now, before the progress bar
+            # starts its refresh thread; forking while it runs can deadlock a
+            # child on the console lock. One shared queue across projects
+            # keeps every worker busy until the last bug, whichever project
+            # it belongs to
+            futures = {
+                executor.submit(
+                    process_func, bug_id, metadata_row, project=project
+                ): (project, bug_id)
+                for project, bug_id, metadata_row in tasks
+            }
+        progress = progress_bar(time_remaining=True)
+        stack.enter_context(progress)
+        progress_task = progress.add_task(
+            "Processing bugs" if sequential else "Processing bugs (parallel)",
+            total=len(tasks),
+        )
 
-    # For parallel processing, use a simpler progress indicator since we can't easily track individual tasks
-    console.print(f"[bold]Starting parallel processing with {jobs} workers...[/bold]")
-    processed = 0
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),
-        TimeElapsedColumn(),
-        console=console,
-    ) as progress:
-        task = progress.add_task(f"Processing {project} bugs (parallel)", total=len(ids))
-        with ProcessPoolExecutor(max_workers=jobs) as executor:
-            completed = 0
-            for result in executor.map(process_func, ids):
-                processed += int(result or 0)
-                completed += 1
-                progress.update(task, completed=completed)
+        def record(
+            project: str, bug_id: int, outcome: Tuple[int, Optional[str]]
+        ) -> None:
+            result, error = outcome
+            if result:
+                mark_done(project, bug_id)
+                processed[project] += result
+            elif error is not None:
+                failed.append((project, bug_id, error))
+            progress.advance(progress_task)
+
+        if sequential:
+            for project, bug_id, metadata_row in tasks:
+                if limit_reached():
+                    break
+                progress.update(
+                    progress_task, description=f"Processing {project}-{bug_id}"
+                )
+                record(
+                    project, bug_id, process_func(bug_id, metadata_row, project=project)
+                )
+            return processed
+
+        try:
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                record(*futures[future], future.result())
+                if limit_reached():
+                    # Bugs already running still finish and are recorded
+                    for pending in futures:
+                        pending.cancel()
+        except BaseException:
+            for pending in futures:
+                pending.cancel()
+            raise
     return processed
 
 
+def preprocess_project(
+    project: str,
+    out_dir: Path,
+    start_id: Optional[int],
+    end_id: Optional[int],
+    main_only: bool,
+    force: bool,
+    stop_on_error: bool = False,
+    jobs: int = 1,
+    cache_dir: Optional[Path] = None,
+    done: Optional[Set[Tuple[str, int]]] = None,
+    errors: Optional[List[Tuple[str, int, str]]] = None,
+) -> int:
+    """Process Defects4J bugs and build method-level diff data.
+
+    ``done`` holds (project, bug_id) pairs from the output manifest (see
+    ``load_done_manifest``); unless ``force`` is set they are skipped without
+    checking for their output files. Every bug processed successfully is
+    appended to the manifest.
+
+    Bugs that fail are appended to ``errors`` as (project, bug_id, message)
+    when a list is given.
+    """
+    tasks = enumerate_bugs(project, out_dir, start_id, end_id, force, done)
+    processed = preprocess_bugs(
+        tasks,
+        out_dir,
+        main_only,
+        force,
+        stop_on_error=stop_on_error,
+        jobs=jobs,
+        cache_dir=cache_dir,
+        errors=errors,
+    )
+    return processed.get(project, 0)
+
+
+def _bug_output_path(out_dir: Path, project: str, bug_id: int) -> Path:
+    """Location of the per-bug JSON output."""
+    return out_dir / f"{project}_{bug_id}.json"
+
+
 def _process_one_bug_impl(
     bug_id: int,
+    metadata_row: Optional[List[str]] = None,
+    *,
     project: str,
     out_dir: Path,
     main_only: bool,
     force: bool,
     stop_on_error: bool,
-) -> int:
-    """Process a single bug - moved to module level for multiprocessing compatibility."""
-    out_path = out_dir / f"{project}_{bug_id}.json"
+    cache_dir: Optional[Path] = None,
+) -> Tuple[int, Optional[str]]:
+    """Process a single bug - moved to module level for multiprocessing compatibility.
+
+    Returns (1, None) on success, (0, None) for skipped bugs and (0, message)
+    when processing failed.
+    """
+    out_path = _bug_output_path(out_dir, project, bug_id)
     if out_path.exists() and not force:
         # Skip existing
-        return 0
+        return 0, None
     
     try:
         # Query the bug metadata to get triggering tests
         try:
-            bug_metadata = _query_bug_metadata(project, bug_id)
+            bug_metadata = _query_bug_metadata(project, bug_id, metadata_row)
         except Exception as meta_ex:
-            console.print(
+            print_status(
                 f"[red]✗[/red] {project}-{bug_id}: Failed to query metadata: {meta_ex}"
             )
             bug_metadata = None
@@ -637,8 +815,8 @@ def _process_one_bug_impl(
 
             # Extract test method code if we have bug metadata
             if bug_metadata and bug_metadata.triggering_tests:
-                console.print(f"[dim]Processing {len(bug_metadata.triggering_tests)} triggering tests...[/dim]")
-                parser = load_java_parser()
+                print_status(f"[dim]Processing {len(bug_metadata.triggering_tests)} triggering tests...[/dim]")
+                parser = get_parser()
                 # Try to find test code in buggy version first, then fixed if not found
                 buggy_test_root = _test_root_for_checkout(buggy)
                 if buggy_test_root:
@@ -651,7 +829,7 @@ def _process_one_bug_impl(
                     t for t in bug_metadata.triggering_tests if not t.source_code
                 ]
                 if missing_code_tests:
-                    console.print(f"[dim]Trying fixed version for {len(missing_code_tests)} missing test methods...[/dim]")
+                    print_status(f"[dim]Trying fixed version for {len(missing_code_tests)} missing test methods...[/dim]")
                     fixed_test_root = _test_root_for_checkout(fixed)
                     if fixed_test_root:
                         _extract_test_method_code(
@@ -664,89 +842,30 @@ def _process_one_bug_impl(
                 )
 
             # Run diff and collect results
-            console.print(f"[dim]Computing method-level diff for {project}-{bug_id}...[/dim]")
-            parser = load_java_parser()
-
-            def _normalize_code_for_diff(code: str) -> str:
-                return re.sub(r"\s+", "", code)
-
-            def _signature_tuple(
-                file_rel_path: str, m: MethodInfo
-            ) -> Tuple[str, str, str, int]:
-                return (
-                    file_rel_path,
-                    m.class_qualifier,
-                    m.method_name,
-                    len(m.parameters or []),
+            print_status(f"[dim]Computing method-level diff for {project}-{bug_id}...[/dim]")
+            diff_results: List[Dict] = []
+            for rel, buggy_file, fixed_file in iter_java_file_pairs(
+                buggy_src, fixed_src
+            ):
+                # Same extraction as run_diff: untouched files are skipped and
+                # a file that fails to parse is reported instead of failing
+                # the whole bug
+                buggy_methods, fixed_methods, failures = _extract_pair_worker(
+                    (buggy_file, fixed_file), cache_dir
+                )
+                for path, error in failures:
+                    print_status(
+                        f"[yellow]⚠[/yellow] Failed to parse {path}: {error}"
+                    )
+                # Only the changed methods of each file are kept
+                diff_results.extend(
+                    diff_file_methods(rel, buggy_methods, fixed_methods)
                 )
-
-            def extract_with_rel(
-                root_dir: Path,
-            ) -> List[Tuple[Tuple[str, str, str, int], MethodInfo]]:
-                pairs: List[Tuple[Tuple[str, str, str, int], MethodInfo]] = []
-                for path in iter_java_files(root_dir):
-                    methods = extract_from_file(parser, path)
-                    rel = os.path.relpath(str(path), str(root_dir))
-                    rel = rel.replace(os.sep, "/")
-                    for m in methods:
-                        sig = _signature_tuple(rel, m)
-                        pairs.append((sig, m))
-                return pairs
-
-            buggy_pairs = extract_with_rel(buggy_src)
-            fixed_pairs = extract_with_rel(fixed_src)
-
-            buggy_map: Dict[Tuple[str, str, str, int], MethodInfo] = {
-                k: v for k, v in buggy_pairs
-            }
-            fixed_map: Dict[Tuple[str, str, str, int], MethodInfo] = {
-                k: v for k, v in fixed_pairs
-            }
-
-            all_keys: Set[Tuple[str, str, str, int]] = set(buggy_map.keys()) | set(
-                fixed_map.keys()
-            )
-
-            diff_results = []
-            for key in sorted(all_keys):
-                b = buggy_map.get(key)
-                f = fixed_map.get(key)
-                status: str
-                if b and f:
-                    code_changed = _normalize_code_for_diff(
-                        b.code
-                    ) != _normalize_code_for_diff(f.code)
-                    javadoc_b = b.javadoc or ""
-                    javadoc_f = f.javadoc or ""
-                    javadoc_changed = javadoc_b != javadoc_f
-                    if not code_changed and not javadoc_changed:
-                        continue
-                    status = "modified"
-                elif b and not f:
-                    status = "removed"
-                elif f and not b:
-                    status = "added"
-                else:
-                    continue
-
-                rec: Dict = {
-                    "status": status,
-                    "signature": {
-                        "file_rel_path": key[0],
-                        "class_qualifier": key[1],
-                        "method_name": key[2],
-                        "arity": key[3],
-                    },
-                    "buggy": dataclasses.asdict(b) if b else None,
-                    "fixed": dataclasses.asdict(f) if f else None,
-                }
-                diff_results.append(rec)
 
             # Create final output with bug metadata
             final_output = {
-                "bug_metadata": dataclasses.asdict(bug_metadata)
-                if bug_metadata
-                else None,
+                # orjson serializes (nested) dataclasses natively
+                "bug_metadata": bug_metadata,
                 "changed_methods": diff_results,
             }
 
@@ -756,21 +875,21 @@ def _process_one_bug_impl(
             )
 
             test_count = len(bug_metadata.triggering_tests) if bug_metadata else 0
-            console.print(
+            print_status(
                 f"[green]✓[/green] {project}-{bug_id}: {len(diff_results)} changed method(s), {test_count} triggering test(s)"
             )
-            return 1
+            return 1, None
     except RuntimeError as ex:
         msg = str(ex)
         if "deprecated bug" in msg.lower() or "deprecated" in msg.lower():
             # Silently skip deprecated bugs without logging
-            return 0
-        console.print(f"[red]✗[/red] {project}-{bug_id}: {msg}")
+            return 0, None
+        print_status(f"[red]✗[/red] {project}-{bug_id}: {msg}")
         if stop_on_error:
             raise
-        return 0
+        return 0, msg
     except Exception as ex:
-        console.print(f"[red]✗[/red] {project}-{bug_id}: {ex}")
+        print_status(f"[red]✗[/red] {project}-{bug_id}: {ex}")
         if stop_on_error:
             raise
-        return 0
+        return 0, str(ex)
@@ -4,215 +4,330 @@ Core extraction functionality for scanning and diffing Java source trees.
 
 from __future__ import annotations
 
-import dataclasses
-import os
-import re
+import contextlib
+import functools
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import orjson
-from rich.console import Console
-from rich.progress import (
-    Progress,
-    SpinnerColumn,
-    TextColumn,
-    BarColumn,
-    TaskProgressColumn,
-    TimeElapsedColumn,
-)
 
+from .console import print_status, progress_bar
 from .models import MethodInfo
-from .parser import extract_from_file, iter_java_files, load_java_parser
+from .parser import (
+    extract_from_file,
+    extract_from_file_pair,
+    get_parser,
+    iter_java_file_pairs,
+    iter_java_files,
+    process_pool_context,
+    same_file_contents,
+)
+
+# Files handled between progress bar updates; per-file updates cost more than
+# parsing a small file on the cached paths
+_PROGRESS_BATCH = 16
+
+# Records are a few hundred bytes each; a large buffer turns them into MB-sized
+# write() calls
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Where records go: a path to create, an already open binary file, or None
+# for stdout
+OutputTarget = Union[None, Path, BinaryIO]
+
+_ASCII_WHITESPACE = b" \t\n\r\f\v"
+
+
+def _stdout_writer() -> BinaryIO:
+    """Binary stdout with an output-sized buffer instead of the default 8 KiB."""
+    sys.stdout.flush()
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, OSError):
+        # Replaced stdout (e.g. captured in tests) without a real descriptor
+        return sys.stdout.buffer
+    # closefd=False: closing the wrapper flushes it but leaves stdout open
+    return open(fd, "wb", buffering=OUTPUT_BUFFER_SIZE, closefd=False)
+
+
+@contextlib.contextmanager
+def _open_record_writer(
+    out_path: OutputTarget, jsonl: bool, pretty: bool = False
+) -> Iterator[Callable[[Any], None]]:
+    """Open the output once and yield a function that streams one record at a time."""
+    # Records may be dicts or dataclasses; orjson serializes dataclasses natively,
+    # which avoids the recursive copy done by dataclasses.asdict.
+    f: BinaryIO
+    if isinstance(out_path, Path):
+        f = open(out_path, "wb", buffering=OUTPUT_BUFFER_SIZE)
+        owned = True
+    elif out_path is None:
+        f = _stdout_writer()
+        owned = f is not sys.stdout.buffer
+    else:
+        f = out_path
+        owned = False
+    first = True
+    # Indentation is opt-in; compact output is smaller and faster to write
+    option = orjson.OPT_INDENT_2 if pretty else 0
+    sep = b",\n" if pretty else b","
+    dumps = orjson.dumps
+    f_write = f.write
+
+    def write_line(rec: Any) -> None:
+        # orjson appends the newline itself, so each record is one write
+        f_write(dumps(rec, option=orjson.OPT_APPEND_NEWLINE))
+
+    def write_element(rec: Any) -> None:
+        # JSON array written element by element
+        nonlocal first
+        if first:
+            f_write(b"[\n" if pretty else b"[")
+            first = False
+        else:
+            f_write(sep)
+        f_write(dumps(rec, option=option))
+
+    try:
+        yield write_line if jsonl else write_element
+        if not jsonl:
+            f.write(b"[]" if first else b"\n]" if pretty else b"]")
+    finally:
+        # Files handed in by the caller stay open; closing the stdout
+        # wrapper only flushes it
+        if owned:
+            f.close()
+        else:
+            f.flush()
+
+
+def _extract_file_worker(
+    path: Path, cache_dir: Optional[Path] = None
+) -> Tuple[Path, List[MethodInfo], Optional[str]]:
+    """Extract methods from one file, returning the error text instead of raising."""
+    # Module level so it can be pickled for ProcessPoolExecutor; each worker
+    # process reuses its own cached parser.
+    try:
+        return path, extract_from_file(get_parser(), path, cache_dir), None
+    except Exception as ex:
+        return path, [], str(ex)
+
+
+def _extract_pair_worker(
+    pair: Tuple[Optional[Path], Optional[Path]], cache_dir: Optional[Path] = None
+) -> Tuple[List[MethodInfo], List[MethodInfo], List[Tuple[Path, str]]]:
+    """Extract methods from the buggy and fixed versions of one file.
+
+    Either side may be None for files present in only one tree. Returns both
+    method lists and the (path, error text) of any file that failed to parse.
+    """
+    buggy_path, fixed_path = pair
+    if buggy_path is not None and fixed_path is not None:
+        if same_file_contents(buggy_path, fixed_path):
+            # An unchanged file cannot contribute any diff records
+            return [], [], []
+        try:
+            buggy, fixed = extract_from_file_pair(
+                get_parser(), buggy_path, fixed_path, cache_dir
+            )
+            return buggy, fixed, []
+        except Exception:
+            # Retry each side alone so one bad file doesn't hide the other
+            pass
+    results: List[List[MethodInfo]] = []
+    failures: List[Tuple[Path, str]] = []
+    for path in pair:
+        if path is None:
+            results.append([])
+            continue
+        _, methods, error = _extract_file_worker(path, cache_dir)
+        if error is not None:
+            failures.append((path, error))
+        results.append(methods)
+    return results[0], results[1], failures
+
+
+@contextlib.contextmanager
+def _map_in_pool(
+    worker: Callable[[Any], Any], items: List[Any], jobs: int
+) -> Iterator[Iterator[Any]]:
+    """Map ``worker`` over items in order, across worker processes when jobs > 1.
+
+    Every item is submitted on entry, so all workers are forked before the
+    caller starts a progress display. Forking while its refresh thread runs
+    can deadlock a child on the console lock.
+    """
+    if jobs <= 1 or len(items) <= 1:
+        yield map(worker, items)
+        return
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=process_pool_context()
+    ) as executor:
+        # Java files are small, so batch them to keep IPC overhead down
+        yield executor.map(worker, items, chunksize=16)
+
 
-console = Console()
+def _iter_extracted(
+    java_files: List[Path], jobs: int, cache_dir: Optional[Path] = None
+) -> ContextManager[Iterator[Tuple[Path, List[MethodInfo], Optional[str]]]]:
+    """Extract methods from files in order, across worker processes when jobs > 1."""
+    worker = functools.partial(_extract_file_worker, cache_dir=cache_dir)
+    return _map_in_pool(worker, java_files, jobs)
 
 
-def run_scan(source_root: Path, out_path: Optional[Path], jsonl: bool) -> int:
-    """Scan a single source tree and extract all methods."""
-    parser = load_java_parser()
-    results: List[Dict] = []
+def run_scan(
+    source_root: Union[str, Path],
+    out_path: OutputTarget,
+    jsonl: bool,
+    jobs: int = 1,
+    cache_dir: Optional[Path] = None,
+    pretty: bool = False,
+) -> int:
+    """Scan a single source tree and extract all methods.
+
+    ``out_path`` may also be an open binary file, which is flushed but left open.
+    """
     count = 0
     
     # Count total Java files first for progress tracking
     java_files = list(iter_java_files(source_root))
-    console.print(f"[dim]Found {len(java_files)} Java files to process[/dim]")
+    print_status(f"[dim]Found {len(java_files)} Java files to process[/dim]")
     
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),
-        TimeElapsedColumn(),
-        console=console,
-    ) as progress:
+    # The pool is started before the progress bar, see _map_in_pool
+    with _open_record_writer(out_path, jsonl, pretty) as write, _iter_extracted(
+        java_files, jobs, cache_dir
+    ) as extracted, progress_bar() as progress:
         task = progress.add_task("Scanning Java files", total=len(java_files))
+        pending = 0
         
-        for path in java_files:
-            try:
-                methods = extract_from_file(parser, path)
+        for path, methods, error in extracted:
+            if error is not None:
+                # Continue after logging; keep extractor robust over imperfect sources
+                print_status(f"[yellow]⚠[/yellow] Failed to parse {path}: {error}")
+            else:
                 for m in methods:
-                    results.append(dataclasses.asdict(m))
+                    write(m)
                     count += 1
-                progress.update(task, description=f"Scanning {path.name} ({count} methods)")
-            except Exception as ex:
-                # Continue after logging; keep extractor robust over imperfect sources
-                console.print(f"[yellow]⚠[/yellow] Failed to parse {path}: {ex}")
-            progress.advance(task)
-
-    if out_path is None:
-        # print to stdout (jsonl or json)
-        if jsonl:
-            for rec in results:
-                sys.stdout.write(orjson.dumps(rec).decode("utf-8") + "\n")
-        else:
-            sys.stdout.write(
-                orjson.dumps(results, option=orjson.OPT_INDENT_2).decode("utf-8")
-            )
-    else:
-        if jsonl:
-            with out_path.open("w", encoding="utf-8") as f:
-                for rec in results:
-                    f.write(orjson.dumps(rec).decode("utf-8") + "\n")
-        else:
-            out_path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+            pending += 1
+            if pending == _PROGRESS_BATCH:
+                progress.update(
+                    task,
+                    advance=pending,
+                    description=f"Scanning {path.name} ({count} methods)",
+                )
+                pending = 0
+        progress.update(task, advance=pending, description=f"Scanned {count} methods")
     return count
 
 
+def _method_signature(m: MethodInfo) -> Tuple[str, str, int]:
+    """Signature of a method within its file: class qualifier, name and arity."""
+    return m.class_qualifier, m.method_name, len(m.parameters or [])
+
+
+def _without_whitespace(code: str) -> bytes:
+    """Method source with ASCII whitespace removed, for lenient change detection."""
+    return code.encode("utf-8").translate(None, _ASCII_WHITESPACE)
+
+
+def diff_file_methods(
+    file_rel_path: str, buggy: List[MethodInfo], fixed: List[MethodInfo]
+) -> Iterator[Dict]:
+    """Yield diff records for one file's buggy and fixed methods, in signature order.
+
+    Methods are matched by class qualifier, method name and arity. Signatures
+    include the file's relative path, so files can be compared one at a time.
+    """
+    buggy_map = {_method_signature(m): m for m in buggy}
+    fixed_map = {_method_signature(m): m for m in fixed}
+    # Set operations on the key views split the signatures up front, so each
+    # method is fetched with one direct lookup. Only the changed methods are
+    # sorted, instead of the union of every signature.
+    changed: List[Tuple[Tuple[str, str, int], str]] = []
+    for key in buggy_map.keys() & fixed_map.keys():
+        b = buggy_map[key]
+        f = fixed_map[key]
+        # Whitespace-insensitive; comments still count as changes. Identical
+        # code skips the stripping, and the javadoc is only compared when the
+        # code matches
+        if (
+            b.code != f.code
+            and _without_whitespace(b.code) != _without_whitespace(f.code)
+        ) or (b.javadoc or "") != (f.javadoc or ""):
+            changed.append((key, "modified"))
+    changed.extend((key, "removed") for key in buggy_map.keys() - fixed_map.keys())
+    changed.extend((key, "added") for key in fixed_map.keys() - buggy_map.keys())
+    changed.sort()
+
+    for key, status in changed:
+        yield {
+            "status": status,
+            "signature": {
+                "file_rel_path": file_rel_path,
+                "class_qualifier": key[0],
+                "method_name": key[1],
+                "arity": key[2],
+            },
+            "buggy": buggy_map.get(key),
+            "fixed": fixed_map.get(key),
+        }
+
+
 def run_diff(
-    buggy_root: Path, fixed_root: Path, out_path: Optional[Path], jsonl: bool
+    buggy_root: Union[str, Path],
+    fixed_root: Union[str, Path],
+    out_path: OutputTarget,
+    jsonl: bool,
+    cache_dir: Optional[Path] = None,
+    pretty: bool = False,
+    jobs: int = 1,
 ) -> int:
-    """Compare buggy and fixed trees and extract relevant methods."""
-    parser = load_java_parser()
-
-    def _normalize_code_for_diff(code: str) -> str:
-        # Remove whitespace for lenient structural diff; keep comments to detect comment-only changes in code
-        return re.sub(r"\s+", "", code)
-
-    def _signature_tuple(
-        file_rel_path: str, m: MethodInfo
-    ) -> Tuple[str, str, str, int]:
-        # Use relative path + class qualifier + method name + arity as signature
-        return (
-            file_rel_path,
-            m.class_qualifier,
-            m.method_name,
-            len(m.parameters or []),
-        )
+    """Compare buggy and fixed trees and extract relevant methods.
 
-    def extract_with_rel(
-        root_dir: Path, desc: str
-    ) -> List[Tuple[Tuple[str, str, str, int], MethodInfo]]:
-        pairs: List[Tuple[Tuple[str, str, str, int], MethodInfo]] = []
-        java_files = list(iter_java_files(root_dir))
-        
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            TaskProgressColumn(),
-            TimeElapsedColumn(),
-            console=console,
-        ) as progress:
-            task = progress.add_task(f"Extracting from {desc} tree", total=len(java_files))
-            
-            for path in java_files:
-                try:
-                    methods = extract_from_file(parser, path)
-                    rel = os.path.relpath(str(path), str(root_dir))
-                    rel = rel.replace(os.sep, "/")
-                    for m in methods:
-                        sig = _signature_tuple(rel, m)
-                        pairs.append((sig, m))
-                    progress.update(task, description=f"Processing {path.name}")
-                except Exception as ex:
-                    console.print(f"[yellow]⚠[/yellow] Failed to parse {path}: {ex}")
-                progress.advance(task)
-        return pairs
-
-    console.print("[dim]Extracting methods from buggy tree...[/dim]")
-    buggy_pairs = extract_with_rel(buggy_root, "buggy")
-    console.print("[dim]Extracting methods from fixed tree...[/dim]")
-    fixed_pairs = extract_with_rel(fixed_root, "fixed")
-
-    console.print("[dim]Building method maps and comparing...[/dim]")
-    buggy_map: Dict[Tuple[str, str, str, int], MethodInfo] = {
-        k: v for k, v in buggy_pairs
-    }
-    fixed_map: Dict[Tuple[str, str, str, int], MethodInfo] = {
-        k: v for k, v in fixed_pairs
-    }
-
-    all_keys: Set[Tuple[str, str, str, int]] = set(buggy_map.keys()) | set(
-        fixed_map.keys()
-    )
-
-    console.print(f"[dim]Comparing {len(all_keys)} unique methods...[/dim]")
-    results: List[Dict] = []
+    ``out_path`` may also be an open binary file, which is flushed but left open.
+    """
+    print_status("[dim]Extracting methods from buggy and fixed trees...[/dim]")
+    pairs = list(iter_java_file_pairs(buggy_root, fixed_root))
+    worker = functools.partial(_extract_pair_worker, cache_dir=cache_dir)
     count = 0
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),
-        TimeElapsedColumn(),
-        console=console,
-    ) as progress:
-        task = progress.add_task("Comparing methods", total=len(all_keys))
-        
-        for key in sorted(all_keys):
-            b = buggy_map.get(key)
-            f = fixed_map.get(key)
-            status: str
-            if b and f:
-                code_changed = _normalize_code_for_diff(b.code) != _normalize_code_for_diff(
-                    f.code
+    # Files present in both trees are handled together, so the fixed version
+    # can be parsed incrementally from the buggy one. Pairs come sorted by
+    # relative path and each file is compared as soon as it is extracted, so
+    # records stream out in signature order without keeping every method of
+    # both trees in memory. The pool is started before the progress bar, see
+    # _map_in_pool.
+    with _open_record_writer(out_path, jsonl, pretty) as write, _map_in_pool(
+        worker, [pair[1:] for pair in pairs], jobs
+    ) as results, progress_bar() as progress:
+        task = progress.add_task("Comparing both trees", total=len(pairs))
+        pending = 0
+        for (rel, _, _), (buggy, fixed, failures) in zip(pairs, results):
+            for path, error in failures:
+                print_status(f"[yellow]⚠[/yellow] Failed to parse {path}: {error}")
+            for rec in diff_file_methods(rel, buggy, fixed):
+                write(rec)
+                count += 1
+            pending += 1
+            if pending == _PROGRESS_BATCH:
+                progress.update(
+                    task, advance=pending, description=f"Found {count} changed methods"
                 )
-                javadoc_b = b.javadoc or ""
-                javadoc_f = f.javadoc or ""
-                javadoc_changed = javadoc_b != javadoc_f
-                if not code_changed and not javadoc_changed:
-                    progress.advance(task)
-                    continue
-                status = "modified"
-            elif b and not f:
-                status = "removed"
-            elif f and not b:
-                status = "added"
-            else:
-                progress.advance(task)
-                continue
-
-            rec: Dict = {
-                "status": status,
-                "signature": {
-                    "file_rel_path": key[0],
-                    "class_qualifier": key[1],
-                    "method_name": key[2],
-                    "arity": key[3],
-                },
-                "buggy": dataclasses.asdict(b) if b else None,
-                "fixed": dataclasses.asdict(f) if f else None,
-            }
-            results.append(rec)
-            count += 1
-            progress.update(task, description=f"Found {count} changed methods")
-            progress.advance(task)
-
-    if out_path is None:
-        if jsonl:
-            for rec in results:
-                sys.stdout.write(orjson.dumps(rec).decode("utf-8") + "\n")
-        else:
-            sys.stdout.write(
-                orjson.dumps(results, option=orjson.OPT_INDENT_2).decode("utf-8")
-            )
-    else:
-        if jsonl:
-            with out_path.open("w", encoding="utf-8") as f:
-                for rec in results:
-                    f.write(orjson.dumps(rec).decode("utf-8") + "\n")
-        else:
-            out_path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+                pending = 0
+        progress.update(
+            task, advance=pending, description=f"Found {count} changed methods"
+        )
     return count
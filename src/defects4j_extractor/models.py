@@ -5,10 +5,15 @@ Data models for the Defects4J extractor.
 from __future__ import annotations
 
 import dataclasses
+import sys
 from typing import List, Optional
 
+# Slotted instances are smaller and faster to read; dataclass only supports
+# them on Python 3.10+
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclasses.dataclass
+
+@dataclasses.dataclass(**_SLOTS)
 class MethodInfo:
     """Information about a Java method extracted from source code."""
 
@@ -4,54 +4,138 @@ Tree-sitter parser and AST processing functionality.
 
 from __future__ import annotations
 
+import hashlib
+import multiprocessing
+import os
 import re
+import sys
+import tempfile
+import threading
 import warnings
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterator, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 # Suppress FutureWarning from tree-sitter library
 warnings.filterwarnings("ignore", category=FutureWarning, module="tree_sitter")
 
-from tree_sitter import Language, Parser
+import orjson
+import tree_sitter_languages
+from tree_sitter import Language, Parser, Query, Tree
 from tree_sitter_languages import get_language
 
 from .models import MethodInfo
 
+# Patterns run on raw source bytes; text is decoded once per final value
+_PKG_RE = re.compile(rb"package\s+([a-zA-Z0-9_\.]+)\s*;")
+_METHOD_NAME_RE = re.compile(rb"([a-zA-Z_$][a-zA-Z0-9_$]*)\s*\(")
+_NON_WS_RE = re.compile(rb"\S")
+
+
+# Loading the grammar dlopens the bundled shared library; do it once per process.
+# Forked workers inherit it and only need to build a lightweight Parser.
+_JAVA_LANGUAGE: Language = get_language("java")
+
+# Node type sets are frozensets: membership is a hash lookup, and the query
+# builder sorts them so the compiled query text is stable
+_CLASS_LIKE_TYPES = frozenset(
+    {
+        "class_declaration",
+        "interface_declaration",
+        "enum_declaration",
+        "record_declaration",
+        "annotation_type_declaration",
+    }
+)
+_METHOD_LIKE_TYPES = frozenset({"method_declaration", "constructor_declaration"})
+# Older grammars emit 'comment'; newer ones split it into line/block comments
+_COMMENT_TYPES = frozenset({"comment", "block_comment", "line_comment"})
+
+
+def _build_declaration_query() -> Query:
+    """Compile one query capturing class-like, method-like and comment nodes."""
+    kinds = {
+        _JAVA_LANGUAGE.node_kind_for_id(i)
+        for i in range(_JAVA_LANGUAGE.node_kind_count)
+    }
+    # Queries fail to compile on unknown node types, so only use known ones
+    comment_types = [t for t in _COMMENT_TYPES if t in kinds]
+
+    def alternation(types: Sequence[str]) -> str:
+        return "[" + " ".join(f"({t})" for t in types) + "]"
+
+    return _JAVA_LANGUAGE.query(
+        f"{alternation(sorted(_CLASS_LIKE_TYPES))} @class\n"
+        f"{alternation(sorted(_METHOD_LIKE_TYPES))} @method\n"
+        f"{alternation(sorted(comment_types))} @comment"
+    )
+
+
+# Matching runs in C, so Python only sees the nodes we care about
+_DECLARATION_QUERY = _build_declaration_query()
+
 
 def load_java_parser() -> Parser:
     """Load and configure a Tree-sitter Java parser."""
-    language: Language = get_language("java")
     parser = Parser()
-    parser.set_language(language)
+    parser.set_language(_JAVA_LANGUAGE)
     return parser
 
 
-def read_text_bytes(path: Path) -> Tuple[str, bytes]:
-    """Read a file as both text and bytes for Tree-sitter parsing."""
-    text = path.read_text(encoding="utf-8", errors="replace")
-    data = text.encode("utf-8")
-    return text, data
-
-
-def byte_to_line_col(byte_offset: int, text: str) -> Tuple[int, int]:
-    """Convert byte offset to 1-based line number and 0-based column from text."""
-    # We operate on unicode text. For safety we re-encode to bytes and count newlines.
-    encoded = text.encode("utf-8")
-    if byte_offset > len(encoded):
-        byte_offset = len(encoded)
-    prefix = encoded[:byte_offset]
-    line = prefix.count(b"\n") + 1
-    last_nl = prefix.rfind(b"\n")
-    if last_nl == -1:
-        col_bytes = len(prefix)
-    else:
-        col_bytes = len(prefix) - last_nl - 1
-    # Convert column in bytes to characters by decoding tail slice
-    line_start = 0 if last_nl == -1 else last_nl + 1
-    col_chars = len(
-        encoded[line_start : line_start + col_bytes].decode("utf-8", errors="ignore")
+def process_pool_context() -> Optional[multiprocessing.context.BaseContext]:
+    """Multiprocessing context for parser worker pools, preferring fork on Linux."""
+    # With fork, workers inherit the already-loaded Java grammar copy-on-write.
+    # macOS offers fork too, but forking after system frameworks have started
+    # threads can crash, which is why spawn is its default
+    return (
+        multiprocessing.get_context("fork")
+        if sys.platform.startswith("linux")
+        else None
     )
-    return line, col_chars
+
+
+# Tree-sitter parsers are not thread-safe, so keep one per thread (and thus one
+# per worker process) instead of rebuilding it for every tree or bug.
+_PARSER_LOCAL = threading.local()
+
+
+def get_parser() -> Parser:
+    """Return the Java parser cached for the current thread, creating it lazily."""
+    parser: Optional[Parser] = getattr(_PARSER_LOCAL, "parser", None)
+    if parser is None:
+        parser = load_java_parser()
+        _PARSER_LOCAL.parser = parser
+    return parser
+
+
+def read_bytes(path: Path) -> bytes:
+    """Read a file as bytes for Tree-sitter parsing, with newlines normalized.
+
+    CRLF and lone CR line endings become LF, as with text mode's universal
+    newlines, so code and byte offsets don't depend on the file's line endings.
+    """
+    # Tree-sitter works on UTF-8 bytes; text is only decoded per node as needed.
+    # A raw fd read sized from fstat avoids the io object stack and usually
+    # completes in a single read() into a single bytes object.
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size) if size else b""
+        if len(data) < size or not size:
+            # Short read, or a file without a reported size; read until EOF
+            chunks = [data]
+            while True:
+                chunk = os.read(fd, 1 << 16)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            data = b"".join(chunks)
+    finally:
+        os.close(fd)
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return data
 
 
 def node_text(source_bytes: bytes, node) -> str:
@@ -75,49 +159,36 @@ def find_package_name(root_node, source_bytes: bytes) -> Optional[str]:
                 ):
                     return node_text(source_bytes, ch).strip()
             # fallback to full node text parsing
-            text = node_text(source_bytes, child)
-            m = re.search(r"package\s+([a-zA-Z0-9_\.]+)\s*;", text)
+            m = _PKG_RE.search(source_bytes, child.start_byte, child.end_byte)
             if m:
-                return m.group(1)
+                return m.group(1).decode("ascii")
     return None
 
 
 def is_class_like(node) -> bool:
     """Check if a Tree-sitter node represents a class-like declaration."""
-    return node.type in (
-        "class_declaration",
-        "interface_declaration",
-        "enum_declaration",
-        "record_declaration",
-        "annotation_type_declaration",
-    )
+    return node.type in _CLASS_LIKE_TYPES
 
 
 def is_method_like(node) -> bool:
     """Check if a Tree-sitter node represents a method-like declaration."""
     # Covers method_declaration and constructor_declaration
-    return node.type in ("method_declaration", "constructor_declaration")
-
-
-def collect_class_stack_names(node, source_bytes: bytes) -> str:
-    """Build nested class/interface names like Outer$Inner."""
-    names: List[str] = []
-    stack: List = []
-    cur = node
-    while cur is not None:
-        stack.append(cur)
-        cur = cur.parent
-    for ancestor in reversed(stack):
-        if is_class_like(ancestor):
-            # find identifier child
-            ident = None
-            for ch in ancestor.children:
-                if ch.type == "identifier":
-                    ident = node_text(source_bytes, ch).strip()
-                    break
-            if ident:
-                names.append(ident)
-    return "$".join(names)
+    return node.type in _METHOD_LIKE_TYPES
+
+
+def class_identifier(node, source_bytes: bytes) -> Optional[str]:
+    """Return the declared name of a class-like node, if any."""
+    # Every class-like declaration stores its identifier in the 'name' field;
+    # the field lookup runs in C instead of visiting each child from Python
+    name = node.child_by_field_name("name")
+    if name is None:
+        return None
+    return node_text(source_bytes, name).strip() or None
+
+
+_PARAMETER_TYPES = frozenset(
+    {"formal_parameter", "receiver_parameter", "spread_parameter"}
+)
 
 
 def extract_parameters(param_node, source_bytes: bytes) -> List[str]:
@@ -126,102 +197,164 @@ def extract_parameters(param_node, source_bytes: bytes) -> List[str]:
     # Grammar: formal_parameters -> '(' (receiver_parameter | formal_parameter (',' formal_parameter)*)? ')'
     params: List[str] = []
     for ch in param_node.children:
-        if ch.type in ("formal_parameter", "receiver_parameter", "spread_parameter"):
-            text = node_text(source_bytes, ch)
-            # collapse whitespace
-            text = re.sub(r"\s+", " ", text).strip()
-            params.append(text)
+        if ch.type in _PARAMETER_TYPES:
+            # collapse whitespace; split/join is cheaper than a regex substitution
+            text = b" ".join(source_bytes[ch.start_byte : ch.end_byte].split())
+            params.append(text.decode("utf-8", errors="replace"))
     return params
 
 
 def find_leading_javadoc(
-    method_node, source_bytes: bytes, text_str: str
+    method_node,
+    source_bytes: bytes,
+    comments: List[Tuple[int, int]],
+    comment_ends: List[int],
 ) -> Optional[str]:
     """Find leading JavaDoc comment for a method node."""
-    # Strategy: look at preceding siblings and trivia before method start; Tree-sitter Java exposes comments as 'comment' tokens
-    # We gather the closest block comment that starts with '/**'
-    start_byte = method_node.start_byte
-    # Scan backwards from start_byte within some window (e.g., up to class start) to find a javadoc block immediately preceding
-    window_start = max(0, start_byte - 20_000)
-    snippet = source_bytes[window_start:start_byte].decode("utf-8", errors="replace")
-    # Find the last /** ... */ before start
-    javadoc_match = None
-    for m in re.finditer(r"/\*\*([\s\S]*?)\*/", snippet):
-        javadoc_match = m
-    if javadoc_match is None:
-        return None
-    # Ensure there is only whitespace/comments between end of javadoc and method start
-    after = snippet[javadoc_match.end() :]
-    if re.search(r"\S", re.sub(r"(?s)/\*.*?\*/|//.*", "", after)):
-        # Non-whitespace content between javadoc and method; consider not directly attached
-        return None
-    raw = "/**" + javadoc_match.group(1) + "*/"
-    return normalize_javadoc(raw)
+    # `comments` holds (start_byte, end_byte) of every comment seen so far in
+    # document order. Walk back from the closest one ending before the method,
+    # skipping other comments, until we reach a '/**' block.
+    pos = method_node.start_byte
+    idx = bisect_right(comment_ends, pos) - 1
+    while idx >= 0:
+        start, end = comments[idx]
+        # Searching in place stops at the first non-whitespace byte instead of
+        # copying the whole gap, which can span most of the file
+        if _NON_WS_RE.search(source_bytes, end, pos):
+            # Non-whitespace content between comment and method; not directly attached
+            return None
+        # "/**/" is an empty block comment, not a javadoc
+        if end - start > 4 and source_bytes.startswith(b"/**", start):
+            return normalize_javadoc(source_bytes[start:end])
+        pos = start
+        idx -= 1
+    return None
 
 
-def normalize_javadoc(raw: str) -> str:
+def normalize_javadoc(raw: bytes) -> str:
     """Normalize JavaDoc content by removing comment markers and leading asterisks."""
     # Remove leading /** and trailing */ and normalize leading * prefixes
     body = raw.strip()
-    if body.startswith("/**"):
+    if body.startswith(b"/**"):
         body = body[3:]
-    if body.endswith("*/"):
+    if body.endswith(b"*/"):
         body = body[:-2]
     lines = body.splitlines()
-    cleaned: List[str] = []
+    cleaned: List[bytes] = []
     for line in lines:
         line = line.rstrip()
-        line = re.sub(r"^\s*\* ?", "", line)
+        # Drop a leading "*" (and one space after it) with the indentation
+        # before it; lines without one are kept as they are
+        rest = line.lstrip()
+        if rest.startswith(b"*"):
+            line = rest[2:] if rest.startswith(b"* ") else rest[1:]
         cleaned.append(line)
     # Trim surrounding blank lines
-    while cleaned and cleaned[0].strip() == "":
+    while cleaned and cleaned[0].strip() == b"":
         cleaned.pop(0)
-    while cleaned and cleaned[-1].strip() == "":
+    while cleaned and cleaned[-1].strip() == b"":
         cleaned.pop()
-    return "\n".join(cleaned)
+    return b"\n".join(cleaned).decode("utf-8", errors="replace")
+
+
+def _method_parameters(
+    param_node, source_bytes: bytes, params_needed: bool
+) -> List[str]:
+    """Parameter texts, or placeholders preserving only the arity."""
+    if params_needed:
+        return extract_parameters(param_node, source_bytes)
+    return [""] * sum(1 for ch in param_node.children if ch.type in _PARAMETER_TYPES)
+
+
+def _iter_declarations(root, source_bytes: bytes) -> Iterator[Tuple[Any, str, str]]:
+    """Yield (node, capture, enclosing class qualifier) for comments and methods.
+
+    Captures arrive in document order; the qualifier is "" outside any class.
+    """
+    # Qualifiers ("Outer", "Outer$Inner", ...) and end offsets of the enclosing
+    # class-like declarations; a class is closed once a capture starts past its
+    # end. Each qualifier is built once when its class is entered, so methods
+    # never rescan class children or rejoin names.
+    qualifier_stack: List[str] = []
+    class_ends: List[int] = []
+    for node, capture in _DECLARATION_QUERY.captures(root):
+        start_byte = node.start_byte
+        while class_ends and class_ends[-1] <= start_byte:
+            class_ends.pop()
+            qualifier_stack.pop()
+        if capture == "class":
+            name = class_identifier(node, source_bytes)
+            if name:
+                if qualifier_stack:
+                    name = f"{qualifier_stack[-1]}${name}"
+                qualifier_stack.append(name)
+                class_ends.append(node.end_byte)
+        else:
+            yield node, capture, qualifier_stack[-1] if qualifier_stack else ""
+
+
+def method_class_qualifiers(root, source_bytes: bytes) -> List[str]:
+    """Distinct class qualifiers of the methods in a file, in document order.
+
+    The qualifiers walk_methods would report, for callers that only need to
+    know which classes declare methods; no method text is decoded or hashed.
+    """
+    seen: Dict[str, None] = {}
+    for _node, capture, class_qualifier in _iter_declarations(root, source_bytes):
+        if capture == "method":
+            seen[class_qualifier] = None
+    return list(seen)
 
 
 def walk_methods(
     root,
     source_bytes: bytes,
-    text_str: str,
     package_name: Optional[str],
     file_path: str,
+    params_needed: bool = True,
 ) -> Iterator[MethodInfo]:
-    """Walk AST and extract all method information."""
-    # DFS traversal collecting methods
-    stack: List = [root]
-    while stack:
-        node = stack.pop()
-        if is_method_like(node):
-            class_qualifier = collect_class_stack_names(node, source_bytes)
-            method_name = "<init>" if node.type == "constructor_declaration" else None
+    """Walk AST and extract all method information.
+
+    With ``params_needed=False`` parameters are reported as empty strings, one
+    per parameter, for callers that only care about arity.
+    """
+    # Captures arrive in document order. Comments are recorded as they are
+    # seen so each method can look up its JavaDoc without rescanning.
+    comments: List[Tuple[int, int]] = []
+    comment_ends: List[int] = []
+    for node, capture, class_qualifier in _iter_declarations(root, source_bytes):
+        if capture == "comment":
+            comments.append((node.start_byte, node.end_byte))
+            comment_ends.append(node.end_byte)
+        else:
+            # Node types are read through the binding once each, not per check
+            is_method = node.type == "method_declaration"
+            method_name = None if is_method else "<init>"
             return_type: Optional[str] = None
             param_list: List[str] = []
 
             for ch in node.children:
-                if node.type == "method_declaration":
-                    if ch.type == "identifier":
+                ch_type = ch.type
+                if ch_type == "formal_parameters":
+                    param_list = _method_parameters(ch, source_bytes, params_needed)
+                elif is_method:
+                    if ch_type == "identifier":
                         method_name = node_text(source_bytes, ch).strip()
-                    elif ch.type == "formal_parameters":
-                        param_list = extract_parameters(ch, source_bytes)
-                    elif ch.type == "type":
+                    elif ch_type == "type":
                         # attempt to capture return type
                         return_type = node_text(source_bytes, ch).strip()
-                elif node.type == "constructor_declaration":
-                    if ch.type == "formal_parameters":
-                        param_list = extract_parameters(ch, source_bytes)
 
+            code_bytes = source_bytes[node.start_byte : node.end_byte]
             if method_name is None:
                 # Fallback: derive from text
-                text_node = node_text(source_bytes, node)
-                m = re.search(r"([a-zA-Z_$][a-zA-Z0-9_$]*)\s*\(", text_node)
-                method_name = m.group(1) if m else "<unknown>"
+                m = _METHOD_NAME_RE.search(code_bytes)
+                method_name = m.group(1).decode("ascii") if m else "<unknown>"
 
-            start_line, _ = byte_to_line_col(node.start_byte, text_str)
-            end_line, _ = byte_to_line_col(node.end_byte, text_str)
-            code = node_text(source_bytes, node)
-            javadoc = find_leading_javadoc(node, source_bytes, text_str)
+            # Tree-sitter points are 0-based (row, column)
+            start_line = node.start_point[0] + 1
+            end_line = node.end_point[0] + 1
+            code = code_bytes.decode("utf-8", errors="replace")
+            javadoc = find_leading_javadoc(node, source_bytes, comments, comment_ends)
 
             yield MethodInfo(
                 file_path=file_path,
@@ -237,23 +370,303 @@ def walk_methods(
                 javadoc=javadoc,
                 code=code,
             )
-        # push children
-        for ch in reversed(node.children or []):
-            stack.append(ch)
 
 
-def iter_java_files(root_dir: Path) -> Iterator[Path]:
+# Once a walk has more than _PARALLEL_WALK_MIN_DIRS pending directories, each
+# of those subtrees is walked on its own thread (scandir releases the GIL).
+# Smaller trees are walked without starting any threads.
+_WALK_THREADS = 8
+_PARALLEL_WALK_MIN_DIRS = 4
+
+_DirListing = Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]
+
+
+def _scan_java_dir(dir_path: str, rel_prefix: str) -> _DirListing:
+    """List one directory.
+
+    Returns (path, relative prefix) of each subdirectory and (relative path,
+    path) of each .java file in it.
+    """
+    subdirs: List[Tuple[str, str]] = []
+    files: List[Tuple[str, str]] = []
+    try:
+        # DirEntry type checks reuse the data returned by readdir
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append((entry.path, f"{rel_prefix}{entry.name}/"))
+                elif entry.name.endswith(".java") and entry.is_file():
+                    files.append((rel_prefix + entry.name, entry.path))
+    except OSError:
+        # Unreadable directory; skip it like Path.rglob does
+        pass
+    return subdirs, files
+
+
+def _list_java_subtree(dir_path: str, rel_prefix: str) -> List[Tuple[str, str]]:
+    """All .java files below one directory, in depth-first walk order."""
+    found: List[Tuple[str, str]] = []
+    pending = [(dir_path, rel_prefix)]
+    while pending:
+        subdirs, files = _scan_java_dir(*pending.pop())
+        found.extend(files)
+        pending.extend(subdirs)
+    return found
+
+
+def _walk_java_files(root_dir: Union[str, Path]) -> Iterator[Tuple[str, str]]:
+    """Yield (path relative to ``root_dir`` using '/', full path) of .java files.
+
+    Relative paths are built while descending, so callers never need
+    os.path.relpath. Wide trees are walked one subtree per thread, but the
+    subtrees are consumed in the order a sequential depth-first walk visits
+    them, so the output order does not depend on thread timing.
+    """
+    pending: List[Tuple[str, str]] = [(os.fspath(root_dir), "")]
+    while pending and len(pending) <= _PARALLEL_WALK_MIN_DIRS:
+        subdirs, files = _scan_java_dir(*pending.pop())
+        yield from files
+        pending.extend(subdirs)
+    if not pending:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(_WALK_THREADS, len(pending))) as pool:
+        subtrees = [pool.submit(_list_java_subtree, *d) for d in pending]
+        try:
+            while subtrees:
+                yield from subtrees.pop().result()
+        finally:
+            # Abandoned walk: don't start subtrees nobody will read
+            for subtree in subtrees:
+                subtree.cancel()
+
+
+def iter_java_files(root_dir: Union[str, Path]) -> Iterator[Path]:
     """Iterate over all .java files in a directory tree."""
-    for p in root_dir.rglob("*.java"):
-        if p.is_file():
-            yield p
+    for _rel, path in _walk_java_files(root_dir):
+        yield Path(path)
+
+
+def iter_java_file_pairs(
+    old_root: Union[str, Path], new_root: Union[str, Path]
+) -> Iterator[Tuple[str, Optional[Path], Optional[Path]]]:
+    """Pair up .java files of two trees by relative path.
+
+    Yields (relative path using '/', old file or None, new file or None),
+    sorted by relative path.
+    """
+    old_files = dict(_walk_java_files(old_root))
+    new_files = dict(_walk_java_files(new_root))
+    for rel in sorted(old_files.keys() | new_files.keys()):
+        old, new = old_files.get(rel), new_files.get(rel)
+        yield (
+            rel,
+            Path(old) if old is not None else None,
+            Path(new) if new is not None else None,
+        )
+
+
+def same_file_contents(a: Path, b: Path) -> bool:
+    """Whether two files hold the same bytes; differing sizes skip the read."""
+    try:
+        if os.stat(a).st_size != os.stat(b).st_size:
+            return False
+        with open(a, "rb") as fa, open(b, "rb") as fb:
+            return fa.read() == fb.read()
+    except OSError:
+        # Let the extraction report the unreadable file
+        return False
+
+
+# Bump when the extracted MethodInfo layout or extraction rules change so stale
+# cache entries are ignored.
+_CACHE_VERSION = 3
+# Entries also depend on the bundled grammar, so a grammar upgrade starts a
+# fresh namespace instead of serving results parsed by the old one
+_CACHE_NAMESPACE = (
+    f"v{_CACHE_VERSION}-grammar"
+    f"{getattr(tree_sitter_languages, '__version__', 'unknown')}"
+)
+
+
+def default_cache_dir() -> Path:
+    """Per-user cache location for extraction results (honours XDG_CACHE_HOME)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return Path(base) / "defects4j-extractor"
 
 
-def extract_from_file(parser: Parser, path: Path) -> List[MethodInfo]:
-    """Extract all method information from a single Java file."""
-    text_str, data = read_text_bytes(path)
-    tree = parser.parse(data)
+def _cache_path(cache_dir: Path, data: bytes) -> Path:
+    """Content-addressed cache location for a file's extraction results."""
+    key = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return cache_dir / _CACHE_NAMESPACE / key[:2] / key
+
+
+def _load_cached_methods(
+    cache_file: Path, file_path: str
+) -> Optional[List[MethodInfo]]:
+    """Load cached methods for a file, or None on a miss or unreadable entry."""
+    try:
+        records = orjson.loads(cache_file.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    try:
+        # The same content may live under different paths (e.g. buggy vs fixed)
+        return [MethodInfo(**{**rec, "file_path": file_path}) for rec in records]
+    except TypeError:
+        return None
+
+
+def _store_cached_methods(cache_file: Path, methods: List[MethodInfo]) -> None:
+    """Write extraction results to the cache atomically; failures are ignored."""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(cache_file.parent), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps(methods))
+            os.replace(tmp, str(cache_file))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        # The cache is an optimization only
+        pass
+
+
+def _methods_from_tree(tree: Tree, data: bytes, file_path: str) -> List[MethodInfo]:
+    """Extract all methods from a parsed tree."""
     root = tree.root_node
     package_name = find_package_name(root, data)
-    methods = list(walk_methods(root, data, text_str, package_name, str(path)))
+    return list(walk_methods(root, data, package_name, file_path))
+
+
+def extract_from_file(
+    parser: Parser, path: Path, cache_dir: Optional[Path] = None
+) -> List[MethodInfo]:
+    """Extract all method information from a single Java file."""
+    data = read_bytes(path)
+    cache_file = _cache_path(cache_dir, data) if cache_dir is not None else None
+    if cache_file is not None:
+        cached = _load_cached_methods(cache_file, str(path))
+        if cached is not None:
+            return cached
+    methods = _methods_from_tree(parser.parse(data), data, str(path))
+    if cache_file is not None:
+        _store_cached_methods(cache_file, methods)
     return methods
+
+
+def _common_prefix_len(a: bytes, b: bytes) -> int:
+    """Length of the common prefix of two byte strings."""
+    # Binary search over slice comparisons, which run as memcmp
+    lo, hi = 0, min(len(a), len(b))
+    if a[:hi] == b[:hi]:
+        return hi
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_len(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the common suffix of two byte strings, capped at ``limit``."""
+    len_a, len_b = len(a), len(b)
+    lo, hi = 0, limit
+    if a[len_a - hi :] == b[len_b - hi :]:
+        return hi
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len_a - mid :] == b[len_b - mid :]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _point_at(
+    data: bytes, offset: int, base: Tuple[int, int] = (0, 0), base_offset: int = 0
+) -> Tuple[int, int]:
+    """Tree-sitter (row, byte column) of a byte offset.
+
+    Newlines are only counted after ``base_offset``, whose point is ``base``,
+    so points inside an edit don't rescan the common prefix.
+    """
+    row = base[0] + data.count(b"\n", base_offset, offset)
+    last_nl = data.rfind(b"\n", base_offset, offset)
+    if last_nl < 0:
+        return row, base[1] + offset - base_offset
+    return row, offset - (last_nl + 1)
+
+
+def _reparse_edited(
+    parser: Parser, old_tree: Tree, old_data: bytes, new_data: bytes
+) -> Tree:
+    """Parse ``new_data`` reusing the unchanged parts of ``old_tree``.
+
+    The edit covers only the span between the common prefix and suffix of the
+    two versions, so tree-sitter keeps every subtree outside it. ``old_tree``
+    is modified in place.
+    """
+    start = _common_prefix_len(old_data, new_data)
+    suffix = _common_suffix_len(
+        old_data, new_data, min(len(old_data), len(new_data)) - start
+    )
+    old_end = len(old_data) - suffix
+    new_end = len(new_data) - suffix
+    start_point = _point_at(old_data, start)
+    old_tree.edit(
+        start_byte=start,
+        old_end_byte=old_end,
+        new_end_byte=new_end,
+        start_point=start_point,
+        old_end_point=_point_at(old_data, old_end, start_point, start),
+        new_end_point=_point_at(new_data, new_end, start_point, start),
+    )
+    return parser.parse(new_data, old_tree)
+
+
+def extract_from_file_pair(
+    parser: Parser,
+    old_path: Path,
+    new_path: Path,
+    cache_dir: Optional[Path] = None,
+) -> Tuple[List[MethodInfo], List[MethodInfo]]:
+    """Extract methods from two versions of a Java file (e.g. buggy and fixed).
+
+    When neither version is cached, the new one is parsed incrementally from
+    the old tree, which is much cheaper for the small edits between versions.
+    """
+    old_data = read_bytes(old_path)
+    new_data = read_bytes(new_path)
+    old_cache = _cache_path(cache_dir, old_data) if cache_dir is not None else None
+    new_cache = _cache_path(cache_dir, new_data) if cache_dir is not None else None
+    old_methods = (
+        _load_cached_methods(old_cache, str(old_path)) if old_cache else None
+    )
+    new_methods = (
+        _load_cached_methods(new_cache, str(new_path)) if new_cache else None
+    )
+
+    if old_methods is None:
+        old_tree = parser.parse(old_data)
+        # Collect before editing: the edit shifts the old tree's offsets
+        old_methods = _methods_from_tree(old_tree, old_data, str(old_path))
+        if old_cache is not None:
+            _store_cached_methods(old_cache, old_methods)
+        if new_methods is None:
+            new_tree = _reparse_edited(parser, old_tree, old_data, new_data)
+            new_methods = _methods_from_tree(new_tree, new_data, str(new_path))
+            if new_cache is not None:
+                _store_cached_methods(new_cache, new_methods)
+    elif new_methods is None:
+        new_methods = _methods_from_tree(
+            parser.parse(new_data), new_data, str(new_path)
+        )
+        if new_cache is not None:
+            _store_cached_methods(new_cache, new_methods)
+    return old_methods, new_methods